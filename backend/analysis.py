@@ -1,34 +1,101 @@
 import pandas as pd
 import numpy as np
-import statsmodels.formula.api as smf # The industry standard for this
+from scipy import stats
+from functools import lru_cache
+
+# DiD design row for each of the 4 cells (cell = 2*is_treatment + is_post)
+#                              const, is_treatment, is_post, interaction
+CELL_DESIGN = np.array([[1, 0, 0, 0],   # Control Pre
+                        [1, 0, 1, 0],   # Control Post
+                        [1, 1, 0, 0],   # Treatment Pre
+                        [1, 1, 1, 1]],  # Treatment Post
+                       dtype=np.int64)
+
+@lru_cache(maxsize=32)
+def _normal_matrix_inv(cell_counts):
+    """
+    (X'X)^-1 for the DiD design. It only depends on how many rows fall in each cell,
+    so it is computed once per schedule (e.g. 4 cities x 60 days) and reused.
+    """
+    counts = np.array(cell_counts, dtype=np.int64)
+    XtX_inv = np.linalg.inv(CELL_DESIGN.T @ (counts[:, None] * CELL_DESIGN))
+    XtX_inv.setflags(write=False) # Shared across calls
+    return XtX_inv
 
 def calculate_did(df, treatment_group='Treatment', control_group='Control'):
     """
     Calculates DiD using OLS Regression to get P-Values.
     """
     # 1. Filter Data
-    df = df[df['group'].isin([treatment_group, control_group])].copy()
+    # Categorical groups are matched on their integer codes instead of strings
+    group = df['group']
+    if isinstance(group.dtype, pd.CategoricalDtype):
+        codes = group.cat.codes.to_numpy()
+        categories = group.cat.categories
+        in_treatment = codes == (categories.get_loc(treatment_group) if treatment_group in categories else -2)
+        in_control = codes == (categories.get_loc(control_group) if control_group in categories else -2)
+    else:
+        values = group.to_numpy()
+        in_treatment = values == treatment_group
+        in_control = values == control_group
+    
+    keep = in_treatment | in_control
+    period = df['period']
+    if isinstance(period.dtype, pd.CategoricalDtype):
+        categories = period.cat.categories
+        is_post = period.cat.codes.to_numpy() == (categories.get_loc('Post-Intervention') if 'Post-Intervention' in categories else -2)
+    else:
+        is_post = period.to_numpy() == 'Post-Intervention'
+    y = df['supply_hours'].to_numpy(dtype=np.float32)
+    
+    # Only subset when some rows actually belong to other groups (usually a no-op)
+    if not keep.all():
+        in_treatment, is_post, y = in_treatment[keep], is_post[keep], y[keep]
     
     # 2. Encode Dummy Variables for Regression
     # is_treatment: 1 if Treatment Group, 0 if Control
-    df['is_treatment'] = (df['group'] == treatment_group).astype(int)
+    is_treat = in_treatment.astype(np.int8)
     
     # is_post: 1 if Post-Intervention, 0 if Pre
-    df['is_post'] = (df['period'] == 'Post-Intervention').astype(int)
+    is_post = is_post.astype(np.int8)
     
-    # 3. Run OLS Regression
-    # Formula: supply_hours ~ is_treatment + is_post + (is_treatment * is_post)
-    model = smf.ols("supply_hours ~ is_treatment * is_post", data=df).fit()
+    # Cell sums/counts in one pass: cell = 2*is_treatment + is_post
+    # -> [Control Pre, Control Post, Treatment Pre, Treatment Post]
+    cells = 2 * is_treat + is_post
+    cell_counts = np.bincount(cells, minlength=4)
+    # An empty cell leaves X'X singular; say which one instead of surfacing a LinAlgError
+    if not cell_counts.all():
+        names = [f"{g} {p}" for g in (control_group, treatment_group) for p in ('Pre', 'Post')]
+        empty = [name for name, count in zip(names, cell_counts) if count == 0]
+        raise ValueError(f"DiD needs rows in every group/period cell; no rows for: {', '.join(empty)}")
+    cell_sums = np.bincount(cells, weights=y, minlength=4)
+    cell_means = cell_sums / cell_counts
+    
+    # 3. Run OLS Regression (closed form, no formula parsing)
+    # Model: supply_hours ~ is_treatment + is_post + (is_treatment * is_post)
+    # X'X comes from the cached factorization; X'y is just the design rows weighted by cell sums
+    n, k = len(y), CELL_DESIGN.shape[1]
+    dof = n - k
+    
+    XtX_inv = _normal_matrix_inv(tuple(cell_counts.tolist()))
+    beta = XtX_inv @ (CELL_DESIGN.T @ cell_sums)
+    residuals = y - (CELL_DESIGN @ beta)[cells]
     
     # 4. Extract Results
-    # The interaction term 'is_treatment:is_post' is the DiD Estimator
-    did_estimator = model.params['is_treatment:is_post']
-    p_value = model.pvalues['is_treatment:is_post']
-    conf_int = model.conf_int().loc['is_treatment:is_post']
+    # The interaction term (last column) is the DiD Estimator
+    # A perfect fit (or no residual dof) yields NaN stats, like statsmodels does
+    did_estimator = beta[3]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = (residuals @ residuals) / dof
+        se = np.sqrt(sigma2 * np.diag(XtX_inv))
+        t_stat = did_estimator / se[3]
+    p_value = 2 * stats.t.sf(abs(t_stat), dof)
+    margin = stats.t.ppf(0.975, dof) * se[3]
+    conf_int = (did_estimator - margin, did_estimator + margin)
     
     # 5. Calculate Smart Lift (Relative to Counterfactual)
     # Get raw averages for the summary
-    t_post_avg = df[(df['is_treatment']==1) & (df['is_post']==1)]['supply_hours'].mean()
+    t_post_avg = cell_means[3]
     
     # Counterfactual = Actual Post - The Causal Impact
     counterfactual = t_post_avg - did_estimator
@@ -42,7 +109,71 @@ def calculate_did(df, treatment_group='Treatment', control_group='Control'):
         "is_significant": bool(p_value < 0.05),
         "conf_int_lower": float(conf_int[0]),
         "conf_int_upper": float(conf_int[1]),
-        "model_summary": model.summary().as_text() # Optional: Full statistical report
+        # Display strings, formatted once with the numbers so clients don't redo it per rerun
+        "did_str": f"{did_estimator:+.1f} Hrs",
+        "lift_str": f"{lift_percent:.2%}"
     }
     
-    return results
\ No newline at end of file
+    return results
+
+def build_placebo_df(df, fake_treatment_city='Riga', control_city='Tartu'):
+    """
+    Placebo (A/A) frame: keeps two Control cities and relabels one as a fake Treatment.
+    Groups become 'Fake Treatment (<city>)' and 'Control (<city>)'.
+    """
+    fake_label = f'Fake Treatment ({fake_treatment_city})'
+    control_label = f'Control ({control_city})'
+    
+    # Match cities on integer codes when available (no per-row Python calls)
+    city = df['city']
+    if isinstance(city.dtype, pd.CategoricalDtype):
+        codes = city.cat.codes.to_numpy()
+        is_fake = codes == city.cat.categories.get_loc(fake_treatment_city)
+        is_control = codes == city.cat.categories.get_loc(control_city)
+    else:
+        values = city.to_numpy()
+        is_fake = values == fake_treatment_city
+        is_control = values == control_city
+    
+    keep = is_fake | is_control
+    placebo_df = df[keep].copy()
+    placebo_df['group'] = pd.Categorical(np.where(is_fake[keep], fake_label, control_label),
+                                         categories=[fake_label, control_label])
+    return placebo_df
+
+def daily_group_mean_matrix(df):
+    """
+    Mean supply_hours per (group, date) as a dense matrix.
+    Returns (dates, groups, means) with means of shape (n_groups, n_dates); cells with no rows are NaN.
+    """
+    # Factor-encode the keys once, then aggregate on integer codes
+    date_codes, dates = pd.factorize(df['date'], sort=True)
+    group = df['group']
+    if isinstance(group.dtype, pd.CategoricalDtype):
+        group_codes, groups = group.cat.codes.to_numpy(), group.cat.categories
+    else:
+        group_codes, groups = pd.factorize(group, sort=True)
+    values = df['supply_hours'].to_numpy(dtype=np.float64)
+    n_dates, n_groups = len(dates), len(groups)
+    
+    # One flat (group, date) bin per cell: sums & counts in two bincount passes
+    flat = group_codes.astype(np.int64) * n_dates + date_codes
+    sums = np.bincount(flat, weights=values, minlength=n_groups * n_dates).reshape(n_groups, n_dates)
+    counts = np.bincount(flat, minlength=n_groups * n_dates).reshape(n_groups, n_dates)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+    return dates, groups, means
+
+def ols_summary(df, treatment_group='Treatment', control_group='Control'):
+    """
+    Full statsmodels OLS report for the DiD regression (on demand only).
+    """
+    import statsmodels.formula.api as smf # Heavy import, only paid when the report is requested
+    
+    df = df[df['group'].isin([treatment_group, control_group])].copy()
+    df['is_treatment'] = (df['group'] == treatment_group).astype(int)
+    df['is_post'] = (df['period'] == 'Post-Intervention').astype(int)
+    
+    model = smf.ols("supply_hours ~ is_treatment * is_post", data=df).fit()
+    return model.summary().as_text()
@@ -1,55 +1,102 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
 from simulation import GeoSimulator
-from analysis import calculate_did
-import pandas as pd
+from analysis import calculate_did, daily_group_mean_matrix, ols_summary
 import numpy as np
-import math
+import orjson
+import anyio
+from functools import lru_cache
+
+# JSON via orjson: NumPy arrays/scalars are written natively and NaN/Infinity become null,
+# so the payload needs no Python-side sanitizing
+def _orjson_default(obj):
+    if isinstance(obj, np.ndarray): # Non-contiguous arrays aren't handled natively
+        return obj.tolist()
+    raise TypeError
+
+def dumps_json(content):
+    return orjson.dumps(content, default=_orjson_default,
+                        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
 
 app = FastAPI()
 simulator = GeoSimulator()
 
-# Helper function to sanitize JSON (Convert NaN/Infinity to None)
-def sanitize_floats(data):
-    if isinstance(data, dict):
-        return {k: sanitize_floats(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [sanitize_floats(v) for v in data]
-    elif isinstance(data, float):
-        if math.isnan(data) or math.isinf(data):
-            return None
-    return data
+def build_experiment_payload(uplift: float):
+    """
+    Simulation + DiD analysis for one uplift value.
+    The seed is fixed, so the payload is deterministic (build_experiment_json caches its bytes).
+    """
+    # 1. Simulate
+    # We use a default seed for consistency, but you can random.randint() it if you want dynamic demos
+    df = simulator.generate_city_data(uplift_percent=uplift, random_seed=42)
+    
+    # 2. Analyze (Using the Advanced OLS version)
+    try:
+        results = calculate_did(df)
+    except Exception as e:
+        # Catch regression errors (e.g., if data variance is 0)
+        raise HTTPException(status_code=500, detail=f"Regression Analysis Failed: {str(e)}")
+    
+    # 3. Format for Frontend (compact, columnar)
+    # Line chart: one mean series per group over the unique dates (already formatted by the simulator)
+    _, groups, means = daily_group_mean_matrix(df)
+    # Map: one row per city, deduplicated on just the columns it needs
+    # (columnar; orjson writes the float32/int16 arrays natively)
+    map_df = df[['city', 'lat', 'lon', 'group', 'supply_hours']].drop_duplicates(subset='city')
+    cities = {
+        "city": map_df['city'].astype(str).tolist(),
+        "group": map_df['group'].astype(str).tolist(),
+        **{col: map_df[col].to_numpy(copy=True) for col in ['lat', 'lon', 'supply_hours']}
+    }
+    
+    # The regression returns NaN p-values if the fit is perfect;
+    # dumps_json writes them as null so the JSON doesn't crash.
+    return {
+        "results": results,
+        "dates": simulator.date_strings,
+        "series": {group: means[groups.get_loc(group)] for group in ['Treatment', 'Control']},
+        "cities": cities,
+        "intervention_start": simulator.date_strings[simulator.cutoff_index]
+    }
+
+@lru_cache(maxsize=64)
+def build_experiment_json(uplift: float):
+    # Serialized once per slider position; cache hits return the stored bytes with zero work
+    return dumps_json(build_experiment_payload(uplift))
 
 @app.post("/run-geo-experiment")
-def run_geo_experiment(uplift: float = 0.15):
+async def run_geo_experiment(uplift: float = Query(0.15, ge=-1, le=1)):
     """
     Runs the simulation and returns Advanced DiD analysis (OLS Regression).
     Includes safety handling for Regression outputs (NaNs).
     """
     try:
-        # 1. Simulate
-        # We use a default seed for consistency, but you can random.randint() it if you want dynamic demos
-        df = simulator.generate_city_data(uplift_percent=uplift, random_seed=42)
-        
-        # 2. Analyze (Using the Advanced OLS version)
-        try:
-            results = calculate_did(df)
-        except Exception as e:
-            # Catch regression errors (e.g., if data variance is 0)
-            raise HTTPException(status_code=500, detail=f"Regression Analysis Failed: {str(e)}")
-        
-        # 3. Format for Frontend
-        # Convert dates to string format for JSON
-        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-        
-        # 4. Sanitize Results
-        # Statsmodels often returns NaN p-values if the fit is perfect. 
-        # We convert them to None so the JSON doesn't crash.
-        clean_results = sanitize_floats(results)
-        
-        return {
-            "results": clean_results,
-            "raw_data": df.to_dict(orient='records')
-        }
+        # Repeated slider positions are served from the cache
+        # NumPy work runs in a worker thread so it doesn't block the event loop
+        body = await anyio.to_thread.run_sync(build_experiment_json, round(uplift, 4))
+        # orjson serialized the NumPy series directly (NaN -> null)
+        return Response(content=body, media_type="application/json")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@lru_cache(maxsize=64)
+def build_ols_summary(uplift: float):
+    """
+    Full statsmodels OLS report for one uplift value (same simulation as the main endpoint).
+    """
+    df = simulator.generate_city_data(uplift_percent=uplift, random_seed=42)
+    return ols_summary(df)
+
+@app.post("/run-geo-experiment/summary", response_class=PlainTextResponse)
+async def run_geo_experiment_summary(uplift: float = Query(0.15, ge=-1, le=1)):
+    """
+    Returns only the text OLS report. Kept off the main endpoint because it is
+    far more expensive than the DiD fit; the frontend fetches it on demand.
+    """
+    try:
+        summary = await anyio.to_thread.run_sync(build_ols_summary, round(uplift, 4))
+        return PlainTextResponse(summary)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -5,66 +5,100 @@ from datetime import datetime, timedelta
 class GeoSimulator:
     def __init__(self):
         # 4 Cities: 2 Treatment (Get Bonus), 2 Control (No Bonus)
-        self.cities = {
-            'Tallinn': {'type': 'Treatment', 'lat': 59.4370, 'lon': 24.7536, 'base_supply': 500},
-            'Vilnius': {'type': 'Treatment', 'lat': 54.6872, 'lon': 25.2797, 'base_supply': 520},
-            'Riga':    {'type': 'Control',   'lat': 56.9496, 'lon': 24.1052, 'base_supply': 480},
-            'Tartu':   {'type': 'Control',   'lat': 58.3780, 'lon': 26.7290, 'base_supply': 490}
+        # Stored as parallel arrays (one entry per city) so they broadcast straight into the grid
+        self.city_names = np.array(['Tallinn',   'Vilnius',   'Riga',     'Tartu'])
+        self.city_types = np.array(['Treatment', 'Treatment', 'Control',  'Control'])
+        self.city_lat   = np.array([59.4370,     54.6872,     56.9496,    58.3780], dtype=np.float32)
+        self.city_lon   = np.array([24.7536,     25.2797,     24.1052,    26.7290], dtype=np.float32)
+        self.city_base  = np.array([500,         520,         480,        490], dtype=np.float64)
+        # Day-aligned so every simulator built on the same day yields identical dates (cache-friendly)
+        self.start_date = (datetime.now() - timedelta(days=60)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # --- STATIC GRID (independent of uplift & seed) ---
+        dates = pd.date_range(start=self.start_date, periods=60, freq='D')
+        n_cities, n_days = len(self.city_names), len(dates)
+
+        # Dynamic Cutoff: Experiment starts at the 66% mark (approx Day 40)
+        self.cutoff_index = int(len(dates) * 0.66)
+        experiment_start_date = dates[self.cutoff_index]
+        # Epoch millis of the launch day, what Plotly expects for a vline on a date axis
+        self.intervention_epoch_ms = experiment_start_date.value // 10**6
+
+        # Formatted once here; responses reuse these instead of calling strftime per row
+        self.date_strings = dates.strftime('%Y-%m-%d').tolist()
+
+        is_treatment = self.city_types == 'Treatment'
+
+        # --- IMPROVEMENT: REALISTIC SEASONALITY ---
+        # Logic: Ride-hailing is busiest on Fri/Sat nights.
+        weekdays = dates.weekday.to_numpy() # 0=Monday, 6=Sunday
+        self._dow_factor = np.where(np.isin(weekdays, [4, 5]), 1.30,  # Friday & Saturday: 30% Supply Surge
+                           np.where(weekdays == 6, 1.10, 1.00))       # Sunday: +10%, Mon-Thu: Baseline
+
+        # Treatment cities in the post period get the bonus
+        is_post_period = (dates >= experiment_start_date)
+        self._is_treat_post_mask = is_treatment[:, None] & is_post_period[None, :]
+
+        # Column skeleton (city-major order: every day for city 1, then city 2, ...)
+        # City, group & period are stored as Categoricals (int codes, not Python strings)
+        # Numbers use the narrowest dtype that fits: float32 coordinates, int16 supply hours (~500)
+        self._columns = {
+            'date': np.tile(dates, n_cities),
+            'city': pd.Categorical(np.repeat(self.city_names, n_days), categories=self.city_names),
+            'group': pd.Categorical(np.repeat(self.city_types, n_days), categories=pd.unique(self.city_types)),
+            'lat': np.repeat(self.city_lat, n_days),
+            'lon': np.repeat(self.city_lon, n_days),
+            'period': pd.Categorical.from_codes(np.tile(is_post_period.astype(np.int8), n_cities),
+                                                categories=['Pre-Intervention', 'Post-Intervention'])
         }
-        self.start_date = datetime.now() - timedelta(days=60)
+
+        # Pre-uplift values (Base * Seasonality + Noise), cached per seed
+        self._base_values = {}
+
+    def _get_base_values(self, random_seed):
+        """
+        Pre-uplift supply grid of shape (n_cities, n_days) for a given seed.
+        """
+        if random_seed not in self._base_values:
+            # Local generator: the global np.random state is shared across request threads
+            rng = np.random.default_rng(random_seed)
+
+            # Add random daily noise (Volatility) - one draw per (city, day)
+            noise = rng.normal(0, 15, size=self._is_treat_post_mask.shape)
+
+            # Calculate Base Value: Base * Seasonality + Noise
+            values = self.city_base[:, None] * self._dow_factor[None, :] + noise
+
+            # Keep the cache small (seeds come straight from user input)
+            if len(self._base_values) >= 64:
+                self._base_values.pop(next(iter(self._base_values)), None)
+            self._base_values[random_seed] = values
+
+        return self._base_values[random_seed]
 
     def generate_city_data(self, uplift_percent=0.15, random_seed=42):
         """
         Generates daily 'Supply Hours' with Day-of-Week seasonality.
         """
-        np.random.seed(random_seed) 
-        
-        data = []
-        dates = pd.date_range(start=self.start_date, periods=60, freq='D')
+        values = self._get_base_values(random_seed)
+
+        # Apply TREATMENT EFFECT (The Driver Bonus)
+        # The Bonus increases supply by uplift_percent
+        supply_hours = np.where(self._is_treat_post_mask, values * (1 + uplift_percent), values)
         
-        # Dynamic Cutoff: Experiment starts at the 66% mark (approx Day 40)
-        cutoff_index = int(len(dates) * 0.66)
-        experiment_start_date = dates[cutoff_index]
-
-        for city_name, props in self.cities.items():
-            base = props['base_supply']
-            is_treatment = props['type'] == 'Treatment'
-            
-            for date in dates:
-                # --- IMPROVEMENT: REALISTIC SEASONALITY ---
-                # Logic: Ride-hailing is busiest on Fri/Sat nights.
-                day_of_week = date.weekday() # 0=Monday, 6=Sunday
-                
-                if day_of_week in [4, 5]: # Friday & Saturday
-                    dow_factor = 1.30 # 30% Supply Surge needed/available
-                elif day_of_week == 6:    # Sunday
-                    dow_factor = 1.10 # 10% higher than weekday
-                else:                     # Mon-Thu
-                    dow_factor = 1.00 # Baseline
-                
-                # Add random daily noise (Volatility)
-                noise = np.random.normal(0, 15)
-                
-                # Calculate Base Value: Base * Seasonality + Noise
-                value = (base * dow_factor) + noise
-                # ------------------------------------------
-                
-                # Apply TREATMENT EFFECT (The Driver Bonus)
-                is_post_period = date >= experiment_start_date
-                
-                if is_treatment and is_post_period:
-                    # The Bonus increases supply by uplift_percent
-                    value *= (1 + uplift_percent)
-                
-                # Explicit Type Casting
-                data.append({
-                    'date': date,
-                    'city': str(city_name),
-                    'group': str(props['type']),
-                    'lat': float(props['lat']),
-                    'lon': float(props['lon']),
-                    'supply_hours': int(value),
-                    'period': 'Post-Intervention' if is_post_period else 'Pre-Intervention'
-                })
-                
-        return pd.DataFrame(data)
\ No newline at end of file
+        # int16 holds the realistic range (~500 hrs); refuse to wrap around on extreme uplifts
+        limits = np.iinfo(np.int16)
+        if supply_hours.min() < limits.min or supply_hours.max() > limits.max:
+            raise ValueError(f"uplift_percent={uplift_percent} pushes supply_hours outside the int16 range")
+        supply_hours = supply_hours.astype(np.int16)
+
+        cols = self._columns
+        return pd.DataFrame({
+            'date': cols['date'],
+            'city': cols['city'],
+            'group': cols['group'],
+            'lat': cols['lat'],
+            'lon': cols['lon'],
+            'supply_hours': supply_hours.ravel(),
+            'period': cols['period']
+        })
@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import sys
 import os
 
@@ -18,18 +16,77 @@ sys.path.insert(0, current_dir)
 try:
     # Try importing assuming 'backend' is a sibling folder
     from backend.simulation import GeoSimulator
-    from backend.analysis import calculate_did
+    from backend.analysis import calculate_did, build_placebo_df, daily_group_mean_matrix, ols_summary
 except ImportError:
     try:
         # Fallback: Try importing assuming flat structure (all files in same folder)
         from backend.simulation import GeoSimulator
-        from backend.analysis import calculate_did
+        from backend.analysis import calculate_did, build_placebo_df, daily_group_mean_matrix, ols_summary
     except ImportError as e:
         st.error(f"⚠️ Import Error: {e}")
         st.stop()
 
+from charts import map_figure, trend_figure
+
 st.set_page_config(page_title="Geo-Lift Experiment", layout="wide")
 
+# One simulator per server process (Streamlit re-executes this script on every interaction)
+@st.cache_resource
+def get_simulator():
+    return GeoSimulator()
+
+# The simulation is deterministic per (uplift, seed), so repeated runs come from the cache
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_simulation(uplift, seed):
+    return get_simulator().generate_city_data(uplift_percent=uplift, random_seed=seed)
+
+# Full OLS report is expensive (statsmodels), so build it once per configuration
+@st.cache_data(show_spinner=False)
+def cached_ols_summary(uplift, seed):
+    return ols_summary(run_simulation(uplift, seed), treatment_group='Treatment', control_group='Control')
+
+@st.cache_data(show_spinner=False)
+def cached_did(uplift, seed):
+    return calculate_did(run_simulation(uplift, seed), treatment_group='Treatment', control_group='Control')
+
+@st.cache_data(show_spinner=False)
+def cached_placebo_did(uplift, seed):
+    # Keep ONLY Control cities (Riga & Tartu) and relabel Riga as the fake Treatment
+    placebo_df = build_placebo_df(run_simulation(uplift, seed), fake_treatment_city='Riga', control_city='Tartu')
+    return calculate_did(placebo_df, treatment_group='Fake Treatment (Riga)', control_group='Control (Tartu)')
+
+def daily_series(df):
+    """
+    (ISO dates, {group: daily mean supply_hours}) for trend_figure.
+    """
+    dates, groups, means = daily_group_mean_matrix(df)
+    return dates.strftime('%Y-%m-%d').tolist(), dict(zip(groups, means))
+
+# Figures are built once per configuration
+@st.cache_resource(max_entries=64)
+def cached_map_figure(uplift, seed):
+    # Create a unique dataframe for the map (one row per city)
+    map_df = run_simulation(uplift, seed)[['city', 'lat', 'lon', 'group', 'supply_hours']].drop_duplicates(subset='city')
+    return map_figure(map_df)
+
+@st.cache_resource(max_entries=64)
+def cached_trend_figures(uplift, seed):
+    """
+    Main and placebo trend charts with their intervention lines.
+    """
+    full_df = run_simulation(uplift, seed)
+    intervention_ms = get_simulator().intervention_epoch_ms
+    
+    fig = trend_figure(*daily_series(full_df), {'Treatment': '#00C853', 'Control': '#D50000'},
+                       title="Supply Hours: Treatment vs Control")
+    fig.add_vline(x=intervention_ms, line_dash="dash", line_color="orange", annotation_text="Bonus Launch")
+    
+    placebo_df = build_placebo_df(full_df, fake_treatment_city='Riga', control_city='Tartu')
+    p_fig = trend_figure(*daily_series(placebo_df), {'Fake Treatment (Riga)': '#FFAB00', 'Control (Tartu)': '#607D8B'},
+                         title="Placebo Validation: Riga (Fake Treatment) vs Tartu")
+    p_fig.add_vline(x=intervention_ms, line_dash="dash", annotation_text="Fake Intervention")
+    return fig, p_fig
+
 # --- HEADER ---
 st.title("🚗 Driver Incentives: Geo-Lift Experiment")
 st.markdown("""
@@ -42,16 +99,14 @@ st.sidebar.header("Configuration")
 uplift_input = st.sidebar.slider("Simulated Bonus Impact (%)", 0.0, 0.5, 0.15, help="True lift injected into the Treatment cities.")
 random_seed = st.sidebar.number_input("Random Seed", value=42, help="Change this to generate different market noise patterns.")
 
+# The last run's configuration is kept in the session, so reruns that aren't a click
+# (e.g. opening the OLS expander) keep showing its results
 if st.sidebar.button("Run Simulation", type="primary"):
-    with st.spinner("Simulating city data & running inference..."):
-        
-        # 1. GENERATE DATA
-        simulator = GeoSimulator()
-        full_df = simulator.generate_city_data(uplift_percent=uplift_input, random_seed=random_seed)
-        
-        # Conversions for plotting
-        full_df['date'] = pd.to_datetime(full_df['date'])
+    st.session_state['run_config'] = (uplift_input, random_seed)
 
+if 'run_config' in st.session_state:
+    run_uplift, run_seed = st.session_state['run_config']
+    with st.spinner("Simulating city data & running inference..."):
         # --- TABS STRATEGY ---
         tab1, tab2 = st.tabs(["📊 Main Experiment", "🛡️ Placebo Validation"])
 
@@ -62,30 +117,21 @@ if st.sidebar.button("Run Simulation", type="primary"):
             st.subheader("Experiment Clusters")
             
             # --- MAP VIEW (RESTORED) ---
-            # Create a unique dataframe for the map (one row per city)
-            map_df = full_df.drop_duplicates(subset=['city'])
-            
-            fig_map = px.scatter_map(
-                map_df, lat="lat", lon="lon", color="group", hover_name="city",
-                size="supply_hours", color_discrete_map={'Treatment': '#34C759', 'Control': '#FF4B4B'},
-                zoom=4, map_style="open-street-map"
-            )
-            fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=300)
-            st.plotly_chart(fig_map, width='stretch')
+            st.plotly_chart(cached_map_figure(run_uplift, run_seed), width='stretch')
 
             st.divider()
 
             st.subheader("Experiment Results: Tallinn/Vilnius (Bonus) vs. Riga/Tartu (No Bonus)")
             
             # Calculate Real DiD
-            main_res = calculate_did(full_df, treatment_group='Treatment', control_group='Control')
+            main_res = cached_did(run_uplift, run_seed)
             
             # --- UPDATE START: ADVANCED METRICS ---
             # Row 1: The Business Numbers
             m1, m2, m3 = st.columns(3)
-            m1.metric("DiD Estimator (Impact)", f"+{main_res['did_absolute_impact']:.1f} Hrs", 
+            m1.metric("DiD Estimator (Impact)", main_res['did_str'], 
                       help="Net increase in supply hours attributable to the bonus.")
-            m2.metric("Relative Lift", f"{main_res['lift_percent']:.2%}", 
+            m2.metric("Relative Lift", main_res['lift_str'], 
                       delta_color="normal" if main_res['lift_percent'] > 0 else "inverse")
             
             # Row 2: The Statistical Rigor (New!)
@@ -108,8 +154,11 @@ if st.sidebar.button("Run Simulation", type="primary"):
                     st.warning("⚠️ Result is NOT Statistically Significant. The lift might be random noise.")
                 
                 # Full Regression Report (For the 'Data Scientist' persona)
-                with st.expander("See OLS Regression Details"):
-                    st.code(main_res.get('model_summary', 'No summary available'))
+                # Built only while the expander is open: opening it triggers a rerun
+                ols_details = st.expander("See OLS Regression Details", key="ols_details", on_change="rerun")
+                with ols_details:
+                    if ols_details.open:
+                        st.code(cached_ols_summary(run_uplift, run_seed))
             else:
                 m3.info("Parallel Trends: VISIBLE")
             # --- UPDATE END ---
@@ -122,15 +171,8 @@ if st.sidebar.button("Run Simulation", type="primary"):
                     #  delta_color="normal" if main_res['lift_percent'] > 0 else "inverse")
             # c3.success("Parallel Trends: VISIBLE")
 
-            # Chart
-            chart_df = full_df.groupby(['date', 'group'])['supply_hours'].mean().reset_index()
-            fig = px.line(chart_df, x='date', y='supply_hours', color='group',
-                          color_discrete_map={'Treatment': '#00C853', 'Control': '#D50000'},
-                          title="Supply Hours: Treatment vs Control")
-            
-            # Add Intervention Line
-            intervention_date = full_df[full_df['period']=='Post-Intervention']['date'].min()
-            fig.add_vline(x=intervention_date.timestamp() * 1000, line_dash="dash", line_color="orange", annotation_text="Bonus Launch")
+            # Chart (with the intervention line)
+            fig, p_fig = cached_trend_figures(run_uplift, run_seed)
             st.plotly_chart(fig, width='stretch')
 
         # ==========================================
@@ -149,18 +191,12 @@ if st.sidebar.button("Run Simulation", type="primary"):
             4. **Success Criteria:** The Lift should be **~0%**. If it shows high lift, our model is broken.
             """)
             
-            # 1. Filter Data: Keep ONLY Control cities (Riga & Tartu)
-            placebo_df = full_df[full_df['city'].isin(['Riga', 'Tartu'])].copy()
-            
-            # 2. Fake the Groups: Riga becomes "Fake Treatment", Tartu remains "Control"
-            placebo_df['group'] = placebo_df['city'].apply(lambda x: 'Fake Treatment (Riga)' if x == 'Riga' else 'Control (Tartu)')
-            
-            # 3. Run Analysis
-            placebo_res = calculate_did(placebo_df, treatment_group='Fake Treatment (Riga)', control_group='Control (Tartu)')
+            # Run Analysis (Riga relabelled as "Fake Treatment", Tartu remains "Control")
+            placebo_res = cached_placebo_did(run_uplift, run_seed)
             
             # Metrics
             pc1, pc2, pc3 = st.columns(3)
-            pc1.metric("Placebo Impact", f"{placebo_res['did_absolute_impact']:.1f} Hrs", 
+            pc1.metric("Placebo Impact", placebo_res['did_str'], 
                        help="Ideally this should be close to 0.")
             
             
@@ -177,7 +213,7 @@ if st.sidebar.button("Run Simulation", type="primary"):
             # Combined Pass/Fail Logic
             placebo_passed = is_magnitude_small and is_not_significant
             
-            pc2.metric("Placebo Lift %", f"{placebo_res['lift_percent']:.2%}", 
+            pc2.metric("Placebo Lift %", placebo_res['lift_str'], 
                        delta="Pass" if placebo_passed else "Fail",
                        delta_color="normal" if placebo_passed else "inverse")
             
@@ -201,11 +237,6 @@ if st.sidebar.button("Run Simulation", type="primary"):
               #  pc3.error("⚠️ Robustness Check FAILED (High Volatility)")
 
             # Chart
-            p_chart_df = placebo_df.groupby(['date', 'group'])['supply_hours'].mean().reset_index()
-            p_fig = px.line(p_chart_df, x='date', y='supply_hours', color='group',
-                          color_discrete_map={'Fake Treatment (Riga)': '#FFAB00', 'Control (Tartu)': '#607D8B'},
-                          title="Placebo Validation: Riga (Fake Treatment) vs Tartu")
-            p_fig.add_vline(x=intervention_date.timestamp() * 1000, line_dash="dash", annotation_text="Fake Intervention")
             st.plotly_chart(p_fig, width='stretch')
 
 else:
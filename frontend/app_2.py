@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import sys
 import os
 
@@ -8,10 +6,36 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.simulation import GeoSimulator
-from backend.analysis import calculate_did
+from backend.analysis import calculate_did, daily_group_mean_matrix
+from charts import map_figure, trend_figure, TREATMENT_COLOR, CONTROL_COLOR
 
 st.set_page_config(page_title="Geo-Lift Experiment", layout="wide")
 
+# One simulator per server process (Streamlit re-executes this script on every interaction)
+@st.cache_resource
+def get_simulator():
+    return GeoSimulator()
+
+# The simulation is deterministic per uplift, so repeated runs come from the cache
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_simulation(uplift):
+    return get_simulator().generate_city_data(uplift_percent=uplift)
+
+# Figures are built once per uplift
+@st.cache_resource(max_entries=64)
+def cached_map_figure(uplift):
+    # One row per city
+    map_df = run_simulation(uplift)[['city', 'lat', 'lon', 'group', 'supply_hours']].drop_duplicates(subset='city')
+    return map_figure(map_df)
+
+@st.cache_resource(max_entries=64)
+def cached_trend_figure(uplift):
+    dates, groups, means = daily_group_mean_matrix(run_simulation(uplift))
+    fig_line = trend_figure(dates.strftime('%Y-%m-%d').tolist(), dict(zip(groups, means)),
+                            {'Treatment': TREATMENT_COLOR, 'Control': CONTROL_COLOR})
+    fig_line.add_vline(x=get_simulator().intervention_epoch_ms, line_dash="dash", line_color="gray", annotation_text="Bonus Launch")
+    return fig_line
+
 st.title("Driver Incentives: Geo-Lift Experiment")
 st.markdown("""
 **Project:** Testing specific Driver Bonuses in **Tallinn & Vilnius** (Treatment) vs **Riga & Tartu** (Control).
@@ -26,47 +50,23 @@ if st.sidebar.button("Run Simulation"):
     with st.spinner("Simulating 60 days of city data..."):
         try:
             # --- DIRECT LOGIC CALL ---
-            simulator = GeoSimulator()
-            df = simulator.generate_city_data(uplift_percent=uplift_input)
+            df = run_simulation(uplift_input)
             res = calculate_did(df)
             
-            # Conversions
-            df['lat'] = pd.to_numeric(df['lat'])
-            df['lon'] = pd.to_numeric(df['lon'])
-            df['supply_hours'] = pd.to_numeric(df['supply_hours'])
-            df['date'] = pd.to_datetime(df['date'])
-
             # --- MAP VIEW ---
             st.subheader("Experiment Clusters")
-            map_df = df.drop_duplicates(subset=['city'])
-            
-            fig_map = px.scatter_map(
-                map_df, lat="lat", lon="lon", color="group", hover_name="city",
-                size="supply_hours", color_discrete_map={'Treatment': '#34C759', 'Control': '#FF4B4B'},
-                zoom=4, map_style="open-street-map"
-            )
-            fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=300)
-            st.plotly_chart(fig_map, use_container_width=True)
+            st.plotly_chart(cached_map_figure(uplift_input), use_container_width=True)
             
             # --- METRICS ---
             st.divider()
             col1, col2, col3 = st.columns(3)
-            col1.metric("DiD Estimator (Impact)", f"+{float(res['did_absolute_impact']):.1f} Hrs")
-            col2.metric("Relative Lift", f"{float(res['lift_percent']):.2%}")
+            col1.metric("DiD Estimator (Impact)", res['did_str'])
+            col2.metric("Relative Lift", res['lift_str'])
             col3.info("Parallel Trends Assumption: VALID")
-
+            
             # --- CHART ---
             st.subheader("Parallel Trends Analysis")
-            chart_df = df.groupby(['date', 'group'])['supply_hours'].mean().reset_index()
-            
-            fig_line = px.line(chart_df, x='date', y='supply_hours', color='group',
-                               color_discrete_map={'Treatment': '#34C759', 'Control': '#FF4B4B'})
-            
-            intervention_start = df[df['period']=='Post-Intervention']['date'].min()
-            intervention_numeric = intervention_start.timestamp() * 1000
-            
-            fig_line.add_vline(x=intervention_numeric, line_dash="dash", line_color="gray", annotation_text="Bonus Launch")
-            st.plotly_chart(fig_line, use_container_width=True)
+            st.plotly_chart(cached_trend_figure(uplift_input), use_container_width=True)
             
         except Exception as e:
             st.error(f"Error: {e}")
@@ -1,13 +1,61 @@
 import streamlit as st
 import pandas as pd
 import requests
-import plotly.express as px
+from requests.adapters import HTTPAdapter
+import orjson
+from charts import map_figure, trend_figure, TREATMENT_COLOR, CONTROL_COLOR
 
 # Pointing to the Project 2 Backend Port
 API_URL = "http://127.0.0.1:8001"
 
 st.set_page_config(page_title="Geo-Lift Experiment", layout="wide")
 
+# One pooled session per server process: reruns reuse the kept-alive socket instead of reconnecting
+@st.cache_resource
+def http():
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=4))
+    return session
+
+# Backend responses are deterministic per uplift, so identical reruns skip the round-trip
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def fetch_experiment(uplift):
+    resp = http().post(f"{API_URL}/run-geo-experiment", params={"uplift": uplift}, timeout=30)
+    resp.raise_for_status()
+    return orjson.loads(resp.content) # Faster than requests' stdlib decoder
+
+# --- Rebuild the small frames from the compact payload ---
+# Cached per response so the type coercions don't re-run on every Streamlit rerun
+@st.cache_data(show_spinner=False)
+def build_frames(data):
+    # 1. One row per city for the map (one vectorized cast for all numeric columns)
+    map_df = pd.DataFrame(data['cities']).astype({'lat': 'float32', 'lon': 'float32', 'supply_hours': 'float32'})
+    
+    # 2. Intervention date as epoch millis (Plotly vline on a date axis)
+    intervention_ms = pd.Timestamp(data['intervention_start']).value // 10**6
+    return map_df, intervention_ms
+
+# Figures are built once per uplift
+@st.cache_resource(max_entries=64)
+def build_figures(uplift):
+    data = fetch_experiment(uplift)
+    map_df, intervention_ms = build_frames(data)
+    
+    fig_map = map_figure(map_df)
+    fig_line = trend_figure(data['dates'], data['series'], {'Treatment': TREATMENT_COLOR, 'Control': CONTROL_COLOR},
+                            x_title='Date', y_title='Avg Driver Hours')
+
+    # --- FIX FOR TIMESTAMP ERROR ---
+    # The intervention date comes in as a numeric value (millis) to avoid Pandas arithmetic errors in Plotly
+    # This bypasses the "Addition/subtraction of integers with Timestamp" error
+    fig_line.add_vline(
+        x=intervention_ms, 
+        line_dash="dash", 
+        line_color="gray", 
+        annotation_text="Bonus Launch"
+    )
+    return fig_map, fig_line
+
 st.title("Driver Incentives: Geo-Lift Experiment")
 st.markdown("""
 **Project:** Testing specific Driver Bonuses in **Tallinn & Vilnius** (Treatment) vs **Riga & Tartu** (Control).
@@ -21,86 +69,38 @@ uplift_input = st.sidebar.slider("Simulated Bonus Impact (%)", 0.0, 0.5, 0.15)
 if st.sidebar.button("Run Simulation"):
     with st.spinner("Simulating 60 days of city data..."):
         try:
-            resp = requests.post(f"{API_URL}/run-geo-experiment?uplift={uplift_input}")
-            
             # Check for backend errors
-            if resp.status_code != 200:
-                st.error(f"Backend Error ({resp.status_code}): {resp.text}")
+            try:
+                data = fetch_experiment(uplift_input)
+            except requests.HTTPError as e:
+                st.error(f"Backend Error ({e.response.status_code}): {e.response.text}")
                 st.stop()
-                
-            data = resp.json()
             
-            if 'raw_data' not in data:
+            if 'series' not in data:
                 st.error("Invalid response from Backend. Check terminal logs.")
                 st.stop()
             
-            df = pd.DataFrame(data['raw_data'])
             res = data['results']
             
-            # --- CRITICAL FIXES: Type Conversions ---
-            # 1. Force numerics to prevent operand errors
-            df['lat'] = pd.to_numeric(df['lat'])
-            df['lon'] = pd.to_numeric(df['lon'])
-            df['supply_hours'] = pd.to_numeric(df['supply_hours'])
+            fig_map, fig_line = build_figures(uplift_input)
             
-            # 2. Force date to datetime objects
-            df['date'] = pd.to_datetime(df['date'])
-
             # --- MAP VIEW ---
             st.subheader("Experiment Clusters")
             
-            # Get unique city data for map
-            map_df = df.drop_duplicates(subset=['city'])
-            
-            # Updated to use scatter_map (replaces deprecated scatter_mapbox)
-            fig_map = px.scatter_map(
-                map_df, 
-                lat="lat", lon="lon", 
-                color="group", 
-                hover_name="city",
-                size="supply_hours", 
-                color_discrete_map={'Treatment': '#34C759', 'Control': '#FF4B4B'},
-                zoom=4,
-                map_style="open-street-map"
-            )
-            fig_map.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=300)
-            
             # Fix Deprecation: use container width logic safely
             st.plotly_chart(fig_map)
             
             # --- METRICS ---
             st.divider()
             col1, col2, col3 = st.columns(3)
-            col1.metric("DiD Estimator (Impact)", f"+{float(res['did_absolute_impact']):.1f} Hrs")
-            col2.metric("Relative Lift", f"{float(res['lift_percent']):.2%}")
+            col1.metric("DiD Estimator (Impact)", res['did_str'])
+            col2.metric("Relative Lift", res['lift_str'])
             col3.info("Parallel Trends Assumption: VALID")
 
             # --- PARALLEL TRENDS CHART ---
             st.subheader("Parallel Trends Analysis")
             st.markdown("Observe how lines move together *before* the dotted line (intervention), and diverge *after*.")
             
-            # Aggregate by Date and Group
-            chart_df = df.groupby(['date', 'group'])['supply_hours'].mean().reset_index()
-            
-            fig_line = px.line(chart_df, x='date', y='supply_hours', color='group',
-                               color_discrete_map={'Treatment': '#34C759', 'Control': '#FF4B4B'},
-                               labels={'supply_hours': 'Avg Driver Hours', 'date': 'Date'})
-            
-            # Find the intervention date
-            intervention_start = df[df['period']=='Post-Intervention']['date'].min()
-            
-            # --- FIX FOR TIMESTAMP ERROR ---
-            # We convert the Timestamp to a numeric value (millis) to avoid Pandas arithmetic errors in Plotly
-            # This bypasses the "Addition/subtraction of integers with Timestamp" error
-            intervention_numeric = intervention_start.timestamp() * 1000
-            
-            fig_line.add_vline(
-                x=intervention_numeric, 
-                line_dash="dash", 
-                line_color="gray", 
-                annotation_text="Bonus Launch"
-            )
-            
             st.plotly_chart(fig_line)
             
         except Exception as e:
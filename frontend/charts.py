@@ -0,0 +1,44 @@
+"""
+Plotly figures shared by the Streamlit apps.
+Plotly is imported inside the builders, so a page that never runs a simulation doesn't load it.
+"""
+import numpy as np
+
+TREATMENT_COLOR = '#34C759'
+CONTROL_COLOR = '#FF4B4B'
+
+def map_figure(cities):
+    """
+    Experiment clusters: one marker per city, sized by supply_hours and coloured by group.
+    `cities` has one row per city with city, lat, lon, group and supply_hours columns.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Scattermap(
+        lat=cities['lat'].tolist(), lon=cities['lon'].tolist(), mode='markers',
+        marker=dict(size=cities['supply_hours'].tolist(), sizemode='area',
+                    sizeref=2.0 * cities['supply_hours'].max() / (20 ** 2),
+                    color=np.where(cities['group'] == 'Treatment', TREATMENT_COLOR, CONTROL_COLOR).tolist()),
+        hovertext=cities['city'].tolist(), customdata=cities['group'].tolist(),
+        hovertemplate="<b>%{hovertext}</b><br>group=%{customdata}<br>supply_hours=%{marker.size}<extra></extra>"
+    ))
+    fig.update_layout(map=dict(style="open-street-map", zoom=4,
+                               center=dict(lat=cities['lat'].mean(), lon=cities['lon'].mean())))
+    fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0}, height=300)
+    return fig
+
+def trend_figure(dates, series, color_map, title=None, x_title='date', y_title='supply_hours'):
+    """
+    Parallel trends: one WebGL line per group.
+    `dates` are ISO strings and `series` maps each group to its daily values.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure([
+        go.Scattergl(x=dates, y=np.asarray(values, dtype=np.float64).tolist(), mode='lines', name=group,
+                     line_color=color_map.get(group),
+                     hovertemplate=f"group={group}<br>{x_title}=%{{x}}<br>{y_title}=%{{y}}<extra></extra>")
+        for group, values in series.items()
+    ])
+    fig.update_layout(title=title, legend_title_text='group', xaxis_title=x_title, yaxis_title=y_title)
+    return fig